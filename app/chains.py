@@ -1,11 +1,18 @@
 from typing import Optional, Dict, List, Any, Tuple, Iterator
-from retrieval import retrieve_documents, format_snippets_to_text
-from prompts import get_rag_prompt, get_agent_prompt
+from retrieval import retrieve_documents, format_snippets_to_text, embed_query, index_is_empty
+from prompts import render_rag_prompt, get_agent_prompt
 from clients import get_llm
+from semantic_cache import SemanticCache
 from langchain_core.messages import HumanMessage, ToolMessage, AIMessage
 from graph import get_agent_graph
 import uuid
 
+# Paraphrased repeats of a question reuse the earlier answer
+RESPONSE_CACHE_THRESHOLD = 0.95  # minimum cosine similarity for a cache hit
+_response_cache = SemanticCache(max_entries=256, threshold=RESPONSE_CACHE_THRESHOLD)
+
+NO_HIT_MESSAGE = "No relevant reviews found for this question. Try a broader question or different filters."
+
 def rag_chain_stream(
     question: str,
     chunk_type: str = "sentence",
@@ -28,20 +35,46 @@ def rag_chain_stream(
     Returns:
         Dictionary with snippets metadata
     """
-    prompt = get_rag_prompt()
     llm = get_llm()
 
     try:
+        if index_is_empty():
+            # Empty index (not ingested yet): no embedding request or LLM call
+            yield NO_HIT_MESSAGE
+            return {"snippets": []}
+
+        # Answers are only reused for identical retrieval settings
+        cache_scope = (chunk_type, vendor, top_k, fetch_k)
+        try:
+            question_embedding = embed_query(question)
+            cached = _response_cache.get(cache_scope, question_embedding)
+        except Exception:
+            # Cache is best-effort; answer uncached
+            question_embedding, cached = None, None
+        if cached is not None:
+            response, snippets = cached
+            yield response
+            return {"snippets": [dict(snippet) for snippet in snippets]}
+
         snippets = retrieve_documents(question, chunk_type, vendor, top_k, fetch_k)
+        if not snippets:
+            # Nothing to ground an answer on; skip the LLM call
+            yield NO_HIT_MESSAGE
+            return {"snippets": []}
         context = format_snippets_to_text(snippets)
 
-        formatted_prompt = prompt.format(context=context, question=question)
+        formatted_prompt = render_rag_prompt(context, question)
 
         # Stream the LLM response
+        chunks = []
         for chunk in llm.stream(formatted_prompt):
             if hasattr(chunk, 'content'):
+                chunks.append(chunk.content)
                 yield chunk.content
 
+        if question_embedding is not None:
+            _response_cache.put(cache_scope, question_embedding, ("".join(chunks), [dict(snippet) for snippet in snippets]))
+
         # Return metadata for UI to access
         return {"snippets": snippets}
     except Exception as e:
@@ -108,7 +141,8 @@ def agentic_response(
     vendor: Optional[str] = None,
     top_k: Optional[int] = None,
     fetch_k: Optional[int] = None,
-    conversation_history: Optional[List] = None
+    conversation_history: Optional[List] = None,
+    thread_id: Optional[str] = None
 ) -> Iterator[str]:
     """Streaming agentic RAG with LangGraph for intelligent analysis.
 
@@ -119,6 +153,7 @@ def agentic_response(
         top_k: Number of results to return
         fetch_k: Number of candidates for MMR
         conversation_history: DEPRECATED - handled via LangGraph checkpointing
+        thread_id: Checkpointer thread holding the conversation (defaults to the Streamlit session's)
 
     Yields:
         Text chunks as they are generated by the agent
@@ -129,16 +164,17 @@ def agentic_response(
     try:
         graph = get_agent_graph()
 
-        # Get thread_id from Streamlit session (will be set in app.py)
+        # Get thread_id from Streamlit session unless passed explicitly
         # This enables conversation persistence across queries
-        try:
-            import streamlit as st
-            if "thread_id" not in st.session_state:
-                st.session_state.thread_id = str(uuid.uuid4())
-            thread_id = st.session_state.thread_id
-        except Exception:
-            # Fallback for non-Streamlit usage (e.g., testing)
-            thread_id = "default"
+        if thread_id is None:
+            try:
+                import streamlit as st
+                if "thread_id" not in st.session_state:
+                    st.session_state.thread_id = str(uuid.uuid4())
+                thread_id = st.session_state.thread_id
+            except Exception:
+                # Fallback for non-Streamlit usage (e.g., testing)
+                thread_id = "default"
 
         # Create config with thread_id for checkpointing
         config = {"configurable": {"thread_id": thread_id}}
@@ -147,28 +183,30 @@ def agentic_response(
         accumulated_tool_outputs = []
         accumulated_snippets = []
 
-        # Stream the graph execution with token-level streaming
-        for message_chunk, metadata in graph.stream(
+        # Stream tokens and state snapshots in one pass; the last snapshot is the final state
+        for mode, payload in graph.stream(
             {
                 "messages": [HumanMessage(content=question)],
                 "tool_outputs": [],
                 "snippets": []
             },
             config=config,
-            stream_mode="messages"
+            stream_mode=["messages", "values"],
+            # Persist one checkpoint when the run finishes instead of one per node
+            durability="exit"
         ):
+            if mode == "values":
+                accumulated_tool_outputs = payload.get("tool_outputs", accumulated_tool_outputs)
+                accumulated_snippets = payload.get("snippets", accumulated_snippets)
+                continue
+
+            message_chunk, metadata = payload
             # Only stream tokens from the agent node (not tools node)
             if metadata.get("langgraph_node") == "agent":
                 # Check if chunk has content before accessing
                 if hasattr(message_chunk, 'content') and message_chunk.content:
                     yield message_chunk.content
 
-        # Get final state to ensure we have all accumulated data
-        final_state = graph.get_state(config)
-        if final_state and final_state.values:
-            accumulated_tool_outputs = final_state.values.get("tool_outputs", accumulated_tool_outputs)
-            accumulated_snippets = final_state.values.get("snippets", accumulated_snippets)
-
         return {
             "tool_outputs": accumulated_tool_outputs,
             "snippets": accumulated_snippets
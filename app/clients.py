@@ -1,7 +1,8 @@
 import chromadb
 import sqlite3
+import threading
+import time
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import Chroma
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -11,11 +12,17 @@ load_dotenv()
 CHROMA_DIR = Path(__file__).resolve().parent.parent / "data" / "chroma_db"
 CHROMA_COLLECTION = "reviews"
 SQLITE_PATH = Path(__file__).resolve().parent.parent / "data" / "sqlite.db"
+SNIPPET_STORE_PATH = Path(__file__).resolve().parent.parent / "data" / "snippet_store.db"
+SNIPPET_STORE_RETENTION = 30 * 24 * 3600  # seconds a stored retrieval stays resolvable
 
 # Global clients (lazy loading)
 _client = None
 _embeddings = None
-_vector_store = None
+_collection = None
+_sqlite_conn = None
+_snippet_store_local = threading.local()
+_snippet_store_ready = False
+_snippet_store_init_lock = threading.Lock()
 _llm = None
 _callbacks = []
 
@@ -39,15 +46,15 @@ def get_embeddings():
         )
     return _embeddings
 
-def get_vector_store():
-    global _vector_store
-    if _vector_store is None:
-        _vector_store = Chroma(
-            client=get_chroma_client(),
-            collection_name=CHROMA_COLLECTION,
-            embedding_function=get_embeddings(),
+def get_collection():
+    """Native Chroma collection for queries that need raw embeddings."""
+    global _collection
+    if _collection is None:
+        _collection = get_chroma_client().get_or_create_collection(
+            name=CHROMA_COLLECTION,
+            embedding_function=None,
         )
-    return _vector_store
+    return _collection
 
 def get_llm():
     global _llm, _callbacks
@@ -61,22 +68,63 @@ def get_llm():
         )
     return _llm
 
+def get_sqlite_connection():
+    """Shared read connection to the reviews database (opened once per process)."""
+    global _sqlite_conn
+    if _sqlite_conn is None:
+        _sqlite_conn = sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+    return _sqlite_conn
+
+def get_snippet_store_connection():
+    """Per-thread connection to the retrieval snippet store.
+
+    Kept apart from sqlite.db, which ingest rebuilds, so stored retrievals
+    outlive restarts like the checkpointed threads that reference them. Tool
+    threads each get their own connection (WAL + busy_timeout handle concurrent
+    writers); the schema is created and expired rows pruned once per process.
+    """
+    global _snippet_store_ready
+    conn = getattr(_snippet_store_local, "conn", None)
+    if conn is None:
+        SNIPPET_STORE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(SNIPPET_STORE_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        with _snippet_store_init_lock:
+            if not _snippet_store_ready:
+                with conn:
+                    conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS retrievals (
+                          retrieval_id TEXT PRIMARY KEY,
+                          snippets BLOB NOT NULL,
+                          created_at REAL NOT NULL
+                        );
+                        """
+                    )
+                    conn.execute(
+                        "DELETE FROM retrievals WHERE created_at < ?",
+                        (time.time() - SNIPPET_STORE_RETENTION,),
+                    )
+                _snippet_store_ready = True
+        _snippet_store_local.conn = conn
+    return conn
+
 def get_review_stats():
     """Query SQLite database to get review counts grouped by vendor."""
     try:
         if not SQLITE_PATH.exists():
             return {}
 
-        with sqlite3.connect(SQLITE_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT vendor, COUNT(*) as count
-                FROM reviews
-                GROUP BY vendor
-                ORDER BY count DESC
-            """)
-            results = cursor.fetchall()
-            return {vendor: count for vendor, count in results}
+        cursor = get_sqlite_connection().execute("""
+            SELECT vendor, COUNT(*) as count
+            FROM reviews
+            GROUP BY vendor
+            ORDER BY count DESC
+        """)
+        results = cursor.fetchall()
+        return {vendor: count for vendor, count in results}
     except Exception as e:
         print(f"Error fetching review stats: {e}")
         return {}
\ No newline at end of file
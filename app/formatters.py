@@ -0,0 +1,183 @@
+import csv
+import io
+import json
+from collections import Counter
+from functools import lru_cache
+from string import Template
+
+# Invariant markdown, compiled once; only substitution happens per call
+_SENTIMENT_TPL = Template("**Sentiment Analysis Summary**\n\n• **Total Reviews:** $total\n")
+_SENTIMENT_RATING_TPL = Template(
+    "• **Average Rating:** $mean/5\n"
+    "• **Positive Reviews:** $positive% (rating ≥4)\n"
+    "• **Negative Reviews:** $negative% (rating ≤2)\n"
+)
+_ASPECTS_TPL = Template("**Top Discussed Aspects** ($total found)\n\n")
+_ASPECT_TPL = Template("**$i. $name** ($frequency mentions$sentiment_info)\n")
+_ASPECT_EXAMPLE_KEYS = (
+    ("Positive", "positive_examples"),
+    ("Neutral", "neutral_examples"),
+    ("Negative", "negative_examples"),
+)
+_JTBD_TPL = Template(
+    "**Jobs-to-Be-Done Analysis**\n"
+    "*Based on $n reviews*\n\n"
+    "**Job:** $job\n\n"
+    "**Situation:** $situation\n\n"
+    "**Motivation:** $motivation\n\n"
+    "**Expected Outcome:** $outcome\n\n"
+)
+
+@lru_cache(maxsize=256)
+def _format_sentiment_analysis(data_json):
+    """Build sentiment analysis markdown from serialized tool output (cached)."""
+    data = json.loads(data_json)
+    if "error" in data:
+        return f"❌ {data['error']}"
+
+    parts = [_SENTIMENT_TPL.substitute(total=data['total_reviews'])]
+
+    if data['mean_rating']:
+        parts.append(_SENTIMENT_RATING_TPL.substitute(
+            mean=data['mean_rating'],
+            positive=data['positive_share'],
+            negative=data['negative_share']
+        ))
+
+    if data['positive_themes']:
+        parts.append("\n**Top Positive Themes:**\n")
+        parts.extend(f"  - {theme}\n" for theme in data['positive_themes'])
+
+    if data['negative_themes']:
+        parts.append("\n**Top Negative Themes:**\n")
+        parts.extend(f"  - {theme}\n" for theme in data['negative_themes'])
+
+    return "".join(parts)
+
+@lru_cache(maxsize=256)
+def _format_aspect_extraction(data_json):
+    """Build aspect extraction markdown from serialized tool output (cached)."""
+    data = json.loads(data_json)
+    if "error" in data:
+        return f"❌ {data['error']}"
+
+    parts = [_ASPECTS_TPL.substitute(total=data['total_aspects'])]
+
+    for i, aspect in enumerate(data['aspects'], 1):
+        sentiment_info = f" • Avg Rating: {aspect['sentiment_score']}/5" if aspect['sentiment_score'] else ""
+        examples = "".join(
+            f"   *{label}:* {aspect[key][0]}\n"
+            for label, key in _ASPECT_EXAMPLE_KEYS
+            if aspect[key]
+        )
+        # One string per aspect block
+        parts.append(_ASPECT_TPL.substitute(
+            i=i,
+            name=aspect['name'].title(),
+            frequency=aspect['frequency'],
+            sentiment_info=sentiment_info
+        ) + examples + "\n")
+
+    return "".join(parts)
+
+@lru_cache(maxsize=256)
+def _format_jtbd_analysis(data_json):
+    """Build JTBD analysis markdown from serialized tool output (cached)."""
+    data = json.loads(data_json)
+    if "error" in data:
+        return f"❌ {data['error']}"
+
+    parts = [_JTBD_TPL.substitute(
+        n=data['total_reviews'],
+        job=data['job'],
+        situation=data['situation'],
+        motivation=data['motivation'],
+        outcome=data['expected_outcome']
+    )]
+
+    if data['frustrations']:
+        parts.append("**Common Frustrations:**\n")
+        parts.extend(f"• {frustration}\n" for frustration in data['frustrations'])
+        parts.append("\n")
+
+    if data['quotes']:
+        parts.append("**Supporting Quotes:**\n")
+        parts.extend(f"• \"{quote}\"\n" for quote in data['quotes'])
+
+    return "".join(parts)
+
+
+def _cache_key(data):
+    """Serialize tool output to a stable, hashable cache key."""
+    return json.dumps(data, sort_keys=True)
+
+def format_sentiment_analysis(data):
+    """Format sentiment analysis JSON data for display."""
+    return _format_sentiment_analysis(_cache_key(data))
+
+def format_aspect_extraction(data):
+    """Format aspect extraction JSON data for display."""
+    return _format_aspect_extraction(_cache_key(data))
+
+def format_jtbd_analysis(data):
+    """Format JTBD analysis JSON data for display."""
+    return _format_jtbd_analysis(_cache_key(data))
+
+def render_tool_outputs(tool_outputs):
+    """Format tool outputs into (display name, markdown) pairs for display."""
+    rendered = []
+    # Number duplicates only for tools called more than once
+    name_counts = Counter(t.get("name", "unknown") for t in tool_outputs)
+    seen_counts = Counter()
+    for tool_entry in tool_outputs:
+        tool_name = tool_entry.get("name", "unknown")
+        output = tool_entry.get("output", {})
+
+        display_name = tool_name.replace('_', ' ').title()
+        if name_counts[tool_name] > 1:
+            seen_counts[tool_name] += 1
+            display_name = f"{display_name} #{seen_counts[tool_name]}"
+
+        # Format tool outputs nicely
+        if tool_name == "sentiment_analysis":
+            tool_markdown = format_sentiment_analysis(output)
+        elif tool_name == "aspect_extraction":
+            tool_markdown = format_aspect_extraction(output)
+        elif tool_name == "jtbd_analysis":
+            tool_markdown = format_jtbd_analysis(output)
+        elif isinstance(output, dict) and "error" in output:
+            tool_markdown = f"❌ {output['error']}"
+        else:
+            tool_markdown = str(output)
+
+        rendered.append((display_name, tool_markdown))
+
+    return rendered
+
+def _format_snippet(i, snippet):
+    """Format a single retrieved snippet as markdown."""
+    vendor = snippet.get('vendor')
+    rating = snippet.get('rating')
+    header = snippet.get('review_header')
+    vendor_info = f" - {vendor.upper()}" if vendor else ""
+    rating_info = f" - ⭐ {rating}/5" if rating else ""
+    header_info = f"*{header}*\n\n" if header else ""
+    return (
+        f"**#{i}** **{snippet.get('source', 'Anonymous')}** - {snippet.get('date', 'Unknown date')}{vendor_info}{rating_info}\n\n"
+        f"{header_info}\"{snippet.get('text', '')}\"\n\n---"
+    )
+
+def render_snippets(snippets):
+    """Format all retrieved snippets as a single markdown block."""
+    return "\n\n".join(_format_snippet(i, snippet) for i, snippet in enumerate(snippets, 1))
+
+
+def snippets_to_csv(snippets):
+    """Serialize retrieved snippets to CSV text for download."""
+    # Union of keys in first-seen order, matching DataFrame column order
+    fieldnames = list(dict.fromkeys(key for snippet in snippets for key in snippet))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(snippets)
+    return buffer.getvalue()
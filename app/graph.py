@@ -1,8 +1,11 @@
 from typing import TypedDict, Annotated, Sequence
 import json
 import sqlite3
+import orjson
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from langchain_core.messages import BaseMessage, SystemMessage, AIMessage, ToolMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledStateGraph
@@ -10,17 +13,100 @@ from langgraph.checkpoint.sqlite import SqliteSaver
 
 from clients import get_llm
 from prompts import get_agent_prompt
-from tools import summarize_sentiment, extract_top_aspects, infer_jtbd, retrieve_reviews
+from tools import summarize_sentiment, extract_top_aspects, infer_jtbd, run_combined_analysis, retrieve_reviews
+from token_tracker import count_tokens
+from retrieval import embed_queries
+
+
+# Token budget for prior conversation turns sent to the LLM
+HISTORY_TOKEN_BUDGET = 4000
+# Max characters of snippet text sent back to the LLM from retrieve_reviews
+LLM_SNIPPET_CHARS = 512
+# Upper bound on tool calls executed concurrently, shared by all sessions
+MAX_TOOL_WORKERS = 4
+# Most recent tool outputs/snippets kept in checkpointed state per thread
+MAX_STATE_ITEMS = 200
+
+# Tools available to the agent, keyed by tool name for dispatch
+TOOLS = [summarize_sentiment, extract_top_aspects, infer_jtbd, run_combined_analysis, retrieve_reviews]
+TOOLS_BY_NAME = {t.name: t for t in TOOLS}
+
+# System prompt is static, so the message is built once and prepended each step
+SYSTEM_MESSAGE = SystemMessage(content=get_agent_prompt())
+
+# Shared tool executor and tool-bound model (lazy loading)
+_tool_executor = None
+_tool_model = None
+
+
+def get_tool_model():
+    """LLM with the agent tools bound; tool schemas are built once per process."""
+    global _tool_model
+    if _tool_model is None:
+        _tool_model = get_llm().bind_tools(TOOLS)
+    return _tool_model
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Process-wide thread pool for tool calls; caps concurrent OpenAI/Chroma requests."""
+    global _tool_executor
+    if _tool_executor is None:
+        _tool_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="tool")
+    return _tool_executor
 
 
 # Custom reducer for accumulating list items
 def add_list_items(left: list, right: list) -> list:
-    """Accumulate list items by concatenating."""
+    """Accumulate list items by concatenating, keeping the newest MAX_STATE_ITEMS.
+
+    The cap bounds what every checkpoint re-serializes as a thread grows.
+    """
     if not isinstance(left, list):
         left = []
     if not isinstance(right, list):
         right = []
-    return left + right
+    if not right:
+        return left
+    return (left + right)[-MAX_STATE_ITEMS:]
+
+
+def _message_text(message: BaseMessage) -> str:
+    """Text that a message contributes to the prompt, including tool call arguments."""
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        text += json.dumps([call["args"] for call in tool_calls])
+    return text
+
+
+def windowed_history(messages: list, max_tokens: int = HISTORY_TOKEN_BUDGET) -> list:
+    """Trim conversation history to the most recent turns that fit the token budget.
+
+    The current turn (from the last HumanMessage on) is always kept. The window
+    starts on a HumanMessage so tool calls are never separated from their results.
+
+    Args:
+        messages: Full conversation history
+        max_tokens: Token budget for the returned messages
+
+    Returns:
+        Tail slice of messages
+    """
+    human_idx = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if len(human_idx) <= 1:
+        return messages
+
+    counts = count_tokens([_message_text(m) for m in messages])
+    total = sum(counts[human_idx[-1]:])
+    start = human_idx[-1]
+    # Extend the window backwards one complete turn at a time
+    for turn_start, turn_end in zip(reversed(human_idx[:-1]), reversed(human_idx[1:])):
+        total += sum(counts[turn_start:turn_end])
+        if total > max_tokens:
+            break
+        start = turn_start
+
+    return messages[start:]
 
 
 class AgentState(TypedDict):
@@ -40,11 +126,10 @@ def agent_node(state: AgentState) -> dict:
     """Agent reasoning node - calls LLM with tools bound.
 
     This node:
-    1. Retrieves current messages from state
+    1. Retrieves current messages from state, trimmed to HISTORY_TOKEN_BUDGET
     2. Adds system prompt if first message
-    3. Binds tools to LLM
-    4. Invokes LLM to decide next action
-    5. Returns updated messages
+    3. Invokes the tool-bound LLM to decide next action
+    4. Returns updated messages
 
     Args:
         state: Current agent state with messages history
@@ -52,17 +137,19 @@ def agent_node(state: AgentState) -> dict:
     Returns:
         Partial state update with new AI message
     """
+    messages = list(state["messages"])
     try:
-        llm = get_llm()
-        tools = [summarize_sentiment, extract_top_aspects, infer_jtbd, retrieve_reviews]
-        model = llm.bind_tools(tools)
+        messages = windowed_history(messages)
+    except Exception as e:
+        # Windowing only saves tokens; send the full history rather than fail the turn
+        print(f"History windowing failed, sending full history: {e}")
 
-        messages = list(state["messages"])
+    try:
+        model = get_tool_model()
 
-        # Add system prompt if this is the first turn (no SystemMessage exists)
-        if not any(isinstance(m, SystemMessage) for m in messages):
-            system_text = get_agent_prompt()
-            messages = [SystemMessage(content=system_text)] + messages
+        # Add system prompt unless history already starts with one
+        if not messages or not isinstance(messages[0], SystemMessage):
+            messages = [SYSTEM_MESSAGE] + messages
 
         # Invoke LLM with tools
         response = model.invoke(messages)
@@ -75,12 +162,138 @@ def agent_node(state: AgentState) -> dict:
         return {"messages": [AIMessage(content=error_msg)]}
 
 
+def _snippets_for_llm(snippets: list) -> list:
+    """Project snippets for the agent's context: drop empty fields, cap text length.
+
+    The UI keeps the full snippets; only the ToolMessage sent to the LLM is trimmed.
+    """
+    projected = []
+    for snippet in snippets:
+        item = {k: v for k, v in snippet.items() if v not in (None, "")}
+        if len(item.get("text", "")) > LLM_SNIPPET_CHARS:
+            item["text"] = item["text"][:LLM_SNIPPET_CHARS] + "…"
+        projected.append(item)
+    return projected
+
+
+def _execute_tool_call(call: dict, tools_dict: dict) -> tuple:
+    """Execute a single tool call.
+
+    Args:
+        call: Tool call from the AI message (name, args, id)
+        tools_dict: Mapping of tool names to tools
+
+    Returns:
+        Tuple of (ToolMessage, tool outputs for UI, snippets for UI)
+    """
+    tool_name = call["name"]
+    tool_func = tools_dict.get(tool_name)
+
+    if not tool_func:
+        # Unknown tool - return error
+        return ToolMessage(
+            tool_call_id=call["id"],
+            content=f"Error: Unknown tool '{tool_name}'"
+        ), [], []
+
+    try:
+        result = tool_func.invoke(call["args"])
+    except Exception as e:
+        # Tool execution error
+        return ToolMessage(
+            tool_call_id=call["id"],
+            content=f"Error executing {tool_name}: {str(e)}",
+            name=tool_name
+        ), [], []
+
+    # Convert result to string for ToolMessage (encoded once, compact, raw UTF-8)
+    if tool_name == "retrieve_reviews" and isinstance(result, dict) and "snippets" in result:
+        # The LLM copies these into analysis tool calls, so send a trimmed projection
+        content_str = orjson.dumps(
+            {**result, "snippets": _snippets_for_llm(result["snippets"])},
+            option=orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+    elif isinstance(result, dict):
+        content_str = orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    else:
+        content_str = str(result)
+
+    tool_message = ToolMessage(
+        tool_call_id=call["id"],
+        content=content_str,
+        name=tool_name
+    )
+
+    # Track outputs for UI
+    tool_outputs = []
+    snippets = []
+    if tool_name == "retrieve_reviews" and isinstance(result, dict):
+        if "snippets" in result:
+            snippets = result["snippets"]
+    elif tool_name in ["sentiment_analysis", "aspect_extraction", "jtbd_analysis"]:
+        tool_outputs = [{"name": tool_name, "output": result}]
+    elif tool_name == "combined_analysis" and isinstance(result, dict):
+        # Split into per-analysis entries so the UI formats each one
+        if "error" in result:
+            tool_outputs = [{"name": tool_name, "output": result}]
+        else:
+            tool_outputs = [{"name": name, "output": output} for name, output in result.items()]
+
+    return tool_message, tool_outputs, snippets
+
+
+def _run_tool_calls(tool_calls: list, tools_dict: dict) -> list:
+    """Execute tool calls, concurrently when the LLM requested more than one.
+
+    Tools are I/O-bound (OpenAI and Chroma requests), so threads let the
+    calls overlap; wall-clock time becomes the slowest call rather than the sum.
+    """
+    if len(tool_calls) == 1:
+        return [_execute_tool_call(tool_calls[0], tools_dict)]
+
+    # Embed all retrieval questions of this turn in one request; tools then hit the cache
+    questions = [
+        call["args"]["question"] for call in tool_calls
+        if call["name"] == "retrieve_reviews" and isinstance(call.get("args", {}).get("question"), str)
+    ]
+    if len(questions) > 1:
+        try:
+            embed_queries(questions)
+        except Exception:
+            pass  # Each tool call embeds (and reports errors) on its own
+
+    # Propagate the Streamlit script context so callbacks can reach session state
+    try:
+        from streamlit.runtime.scriptrunner_utils.script_run_context import (
+            SCRIPT_RUN_CONTEXT_ATTR_NAME, add_script_run_ctx, get_script_run_ctx
+        )
+        script_ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        script_ctx = None
+
+    def run(call):
+        if script_ctx is None:
+            return _execute_tool_call(call, tools_dict)
+        # Pool threads serve every session: attach this session's ctx for this
+        # task only and restore the previous one, so the next task never runs under it
+        thread = threading.current_thread()
+        previous_ctx = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+        add_script_run_ctx(thread, script_ctx)
+        try:
+            return _execute_tool_call(call, tools_dict)
+        finally:
+            # add_script_run_ctx(thread, None) would re-attach the caller's ctx, so reset directly
+            setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous_ctx)
+
+    return list(get_tool_executor().map(run, tool_calls))
+
+
 def tools_node(state: AgentState) -> dict:
     """Execute requested tools and track outputs.
 
     This node:
     1. Extracts tool calls from last AI message
-    2. Executes each tool with provided arguments
+    2. Executes the tools with provided arguments (concurrently if several)
     3. Creates ToolMessage objects for LLM
     4. Tracks tool outputs and snippets separately for UI
 
@@ -98,58 +311,15 @@ def tools_node(state: AgentState) -> dict:
         if not tool_calls:
             return {"messages": []}
 
-        tools_dict = {
-            "sentiment_analysis": summarize_sentiment,
-            "aspect_extraction": extract_top_aspects,
-            "jtbd_analysis": infer_jtbd,
-            "retrieve_reviews": retrieve_reviews
-        }
-
         tool_messages = []
         new_tool_outputs = []
         new_snippets = []
 
-        for call in tool_calls:
-            tool_name = call["name"]
-            tool_func = tools_dict.get(tool_name)
-
-            if not tool_func:
-                # Unknown tool - return error
-                tool_messages.append(ToolMessage(
-                    tool_call_id=call["id"],
-                    content=f"Error: Unknown tool '{tool_name}'"
-                ))
-                continue
-
-            try:
-                result = tool_func.invoke(call["args"])
-
-                # Convert result to string for ToolMessage
-                if isinstance(result, dict):
-                    content_str = json.dumps(result)
-                else:
-                    content_str = str(result)
-
-                tool_messages.append(ToolMessage(
-                    tool_call_id=call["id"],
-                    content=content_str,
-                    name=tool_name
-                ))
-
-                # Track outputs for UI
-                if tool_name == "retrieve_reviews" and isinstance(result, dict):
-                    if "snippets" in result:
-                        new_snippets.extend(result["snippets"])
-                elif tool_name in ["sentiment_analysis", "aspect_extraction", "jtbd_analysis"]:
-                    new_tool_outputs.append({"name": tool_name, "output": result})
-
-            except Exception as e:
-                # Tool execution error
-                tool_messages.append(ToolMessage(
-                    tool_call_id=call["id"],
-                    content=f"Error executing {tool_name}: {str(e)}",
-                    name=tool_name
-                ))
+        # Results come back in call order, so tool messages match tool_calls
+        for tool_message, tool_outputs, snippets in _run_tool_calls(tool_calls, TOOLS_BY_NAME):
+            tool_messages.append(tool_message)
+            new_tool_outputs.extend(tool_outputs)
+            new_snippets.extend(snippets)
 
         return {
             "messages": tool_messages,
@@ -175,10 +345,8 @@ def should_continue(state: AgentState) -> str:
     Returns:
         "continue" to execute tools, "end" to finish
     """
-    last_message = state["messages"][-1]
-
     # Check if LLM made tool calls
-    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
+    if getattr(state["messages"][-1], "tool_calls", None):
         return "continue"
 
     # No tool calls - end conversation
@@ -220,6 +388,10 @@ def create_agent_graph() -> CompiledStateGraph:
     # Compile with SQLite checkpointing for persistence
     # Create persistent connection for checkpointing (thread-safe for reuse)
     conn = sqlite3.connect("data/agent_checkpoints.db", check_same_thread=False)
+    # SqliteSaver.setup() already enables WAL; these are per-connection settings
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
     checkpointer = SqliteSaver(conn)
     graph = workflow.compile(checkpointer=checkpointer)
 
@@ -1,19 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 import sqlite3
+import uuid
 import pandas as pd
 import chromadb
 import nltk
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
-
 load_dotenv()
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
@@ -21,6 +17,27 @@ REVIEWS_DIR = DATA_DIR / "reviews"
 SQLITE_PATH = DATA_DIR / "sqlite.db"
 CHROMA_PATH = DATA_DIR / "chroma_db"
 
+# Embed outside Chroma: shards are embedded concurrently, then written with
+# precomputed vectors straight to the native collection
+EMBED_BATCH = 512  # texts per embeddings request
+EMBED_WORKERS = 4  # concurrent embeddings requests
+WRITE_BATCH = 250  # rows per collection.add call
+
+# Sentence tokenizer (lazy loading)
+_sent_tokenizer = None
+
+def get_sent_tokenizer():
+    """Trained Punkt model, loaded once (sent_tokenize resolves it per call)."""
+    global _sent_tokenizer
+    if _sent_tokenizer is None:
+        # Download required NLTK data
+        try:
+            nltk.data.find('tokenizers/punkt_tab')
+        except LookupError:
+            nltk.download('punkt_tab')
+        _sent_tokenizer = nltk.tokenize.PunktTokenizer("english")
+    return _sent_tokenizer
+
 # 1) Load reviews
 def load_reviews(folder):
     """Read all CSVs from folder and add a 'vendor' column from filename."""
@@ -31,44 +48,72 @@ def load_reviews(folder):
         files.append(df)
     return pd.concat(files, ignore_index=True).fillna("")
 
-df = load_reviews(REVIEWS_DIR)
-
 # 2) Build SQLite schema
-with sqlite3.connect(SQLITE_PATH) as con:
-    con.execute("DROP TABLE IF EXISTS reviews;")
-    con.execute(
-        """
-        CREATE TABLE IF NOT EXISTS reviews (
-          id INTEGER PRIMARY KEY,
-          name TEXT,
-          country TEXT,
-          date TEXT,
-          review_score INTEGER,
-          review_header TEXT,
-          review_body TEXT,
-          vendor TEXT
-        );
-        """
-    )
-    df.to_sql("reviews", con, if_exists="replace", index=False)
+def load_sqlite(df):
+    """Recreate the reviews table and bulk-insert all rows."""
+    with sqlite3.connect(SQLITE_PATH) as con:
+        con.execute("DROP TABLE IF EXISTS reviews;")
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reviews (
+              id INTEGER PRIMARY KEY,
+              name TEXT,
+              country TEXT,
+              date TEXT,
+              review_score INTEGER,
+              review_header TEXT,
+              review_body TEXT,
+              vendor TEXT
+            );
+            """
+        )
+        # WAL lets the app keep reading while ingest writes; NORMAL sync is safe under WAL
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        # Bulk insert in one transaction (the connection context manager commits)
+        con.executemany(
+            """
+            INSERT INTO reviews (name, country, date, review_score, review_header, review_body, vendor)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            df[["name", "country", "date", "review_score", "review_header", "review_body", "vendor"]]
+            .itertuples(index=False, name=None),
+        )
 
 # 3) Build LangChain documents with hybrid chunking
 def create_hybrid_documents(df):
-    """Create both full review documents and sentence-level chunks."""
+    """Create both full review documents and sentence-level chunks.
+
+    Returns:
+        Tuple of (documents, review count, sentence count)
+    """
+    sent_tokenizer = get_sent_tokenizer()
     all_docs = []
+    review_count = 0
+    sentence_count = 0
+
+    # Pull columns once as native Python lists instead of building a Series per row
+    rows = zip(
+        df.index.tolist(),
+        df["name"].tolist(),
+        df["country"].tolist(),
+        df["date"].tolist(),
+        df["review_score"].tolist(),
+        df["vendor"].tolist(),
+        df["review_header"].astype(str).str.strip().tolist(),
+        df["review_body"].astype(str).str.strip().tolist(),
+    )
 
-    for idx, row in df.iterrows():
-        review_id = f"{row.get('vendor')}_{idx}"
-        header = row.get('review_header', '').strip()
-        body = row.get('review_body', '').strip()
+    for idx, name, country, date, score, vendor, header, body in rows:
+        review_id = f"{vendor}_{idx}"
 
         # Base metadata for all chunks
         base_meta = {
-            "name": row.get("name"),
-            "country": row.get("country"),
-            "date": row.get("date"),
-            "score": row.get("review_score"),
-            "vendor": row.get("vendor"),
+            "name": name,
+            "country": country,
+            "date": date,
+            "score": score,
+            "vendor": vendor,
             "review_id": review_id,
         }
 
@@ -79,11 +124,12 @@ def create_hybrid_documents(df):
             metadata={**base_meta, "chunk_type": "review", "chunk_level": "full"}
         )
         all_docs.append(full_doc)
+        review_count += 1
 
         # 2) Sentence-level documents from body (if exists and non-trivial)
-        if body and len(body.split()) > 5:  # Only chunk non-trivial bodies
+        if body and len(body.split(maxsplit=5)) > 5:  # Only chunk non-trivial bodies
             try:
-                sentences = nltk.sent_tokenize(body)
+                sentences = sent_tokenizer.tokenize(body)
                 for i, sentence in enumerate(sentences):
                     if len(sentence.strip()) > 3:  # Skip very short sentences
                         sentence_doc = Document(
@@ -98,39 +144,55 @@ def create_hybrid_documents(df):
                             }
                         )
                         all_docs.append(sentence_doc)
+                        sentence_count += 1
             except Exception as e:
                 print(f"Error tokenizing review {review_id}: {e}")
                 # Fallback: treat as single chunk
                 continue
 
-    return all_docs
-
-docs = create_hybrid_documents(df)
+    return all_docs, review_count, sentence_count
 
 # 4) Load to ChromaDB
-client = chromadb.PersistentClient(path=str(CHROMA_PATH))
-# Reset collection
-try:
-    client.delete_collection("reviews")
-except Exception:
-    pass
-
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-vectordb = Chroma(
-    client=client,
-    collection_name="reviews",
-    embedding_function=embeddings,
-)
-
-BATCH = 1000
-# Count chunk types efficiently
-review_count = sum(1 for d in docs if d.metadata.get('chunk_type') == 'review')
-sentence_count = len(docs) - review_count
-print(f"Ingesting {len(docs)} documents ({review_count} reviews + {sentence_count} sentences)")
-
-for start in range(0, len(docs), BATCH):
-    batch = docs[start:start + BATCH]
-    vectordb.add_documents(batch)
-    print(f"Processed batch {start//BATCH + 1}/{(len(docs) + BATCH - 1)//BATCH}")
-
-print("Ingestion complete!")
\ No newline at end of file
+def embed_shard(embeddings, shard):
+    """Embed one shard of documents with a single embeddings request."""
+    return embeddings.embed_documents([doc.page_content for doc in shard])
+
+def load_chroma(docs):
+    """Reset the reviews collection and write docs with precomputed embeddings."""
+    client = chromadb.PersistentClient(path=str(CHROMA_PATH))
+    # Reset collection
+    try:
+        client.delete_collection("reviews")
+    except Exception:
+        pass
+
+    embeddings = OpenAIEmbeddings(model="text-embedding-3-small", chunk_size=EMBED_BATCH)
+    collection = client.get_or_create_collection(name="reviews", embedding_function=None)
+
+    shards = [docs[start:start + EMBED_BATCH] for start in range(0, len(docs), EMBED_BATCH)]
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        # map() yields in shard order, so each shard is written as soon as it is ready
+        vectors_per_shard = executor.map(partial(embed_shard, embeddings), shards)
+        for n, (shard, vectors) in enumerate(zip(shards, vectors_per_shard), 1):
+            for start in range(0, len(shard), WRITE_BATCH):
+                batch = shard[start:start + WRITE_BATCH]
+                collection.add(
+                    ids=[str(uuid.uuid4()) for _ in batch],
+                    embeddings=vectors[start:start + WRITE_BATCH],
+                    documents=[doc.page_content for doc in batch],
+                    metadatas=[doc.metadata for doc in batch],
+                )
+            print(f"Processed batch {n}/{len(shards)}")
+
+def main():
+    df = load_reviews(REVIEWS_DIR)
+    load_sqlite(df)
+
+    docs, review_count, sentence_count = create_hybrid_documents(df)
+    print(f"Ingesting {len(docs)} documents ({review_count} reviews + {sentence_count} sentences)")
+    load_chroma(docs)
+
+    print("Ingestion complete!")
+
+if __name__ == "__main__":
+    main()
@@ -39,12 +39,21 @@ class RetrievalResult(BaseModel):
     """Normalized retrieval payload returned by retrieve_documents function."""
     snippets: List[Snippet] = Field(..., description="List of review snippets to analyze")
     count: int = Field(..., description="Total number of snippets analyzed")
+    retrieval_id: Optional[str] = Field(None, description="Id analysis tools accept in place of the snippets")
 
 class ToolInput(BaseModel):
     """Standardized input payload for analysis tools."""
-    snippets: List[Snippet] = Field(..., description="List of review snippets to analyze")
+    snippets: List[Snippet] = Field(default_factory=list, description="List of review snippets to analyze (not needed when retrieval_id is given)")
+    retrieval_id: Optional[str] = Field(None, description="retrieval_id returned by retrieve_reviews; pass it instead of copying the snippets")
     question: str = Field(..., description="Question to analyze the snippets for")
 
+class CombinedToolInput(ToolInput):
+    """Input payload for the combined analysis tool."""
+    analyses: Optional[List[Literal["sentiment", "aspects", "jtbd"]]] = Field(
+        default=None,
+        description="Analyses to run in the single call; defaults to all three",
+    )
+
 class Sentiment(BaseModel):
     """Complete sentiment analysis result from reviews."""
     total_reviews: int = Field(0, description="Total number of reviews analyzed")
@@ -75,4 +84,10 @@ class JTBD(BaseModel):
     motivation: str = Field(description="Why customers want to accomplish this job")
     expected_outcome: str = Field(description="What success looks like for customers")
     frustrations: List[str] = Field(default_factory=list, description="Common pain points")
-    quotes: List[str] = Field(default_factory=list, description="Supporting customer quotes")
\ No newline at end of file
+    quotes: List[str] = Field(default_factory=list, description="Supporting customer quotes")
+
+class CombinedAnalysis(BaseModel):
+    """Sentiment, aspect and JTBD analyses produced in a single pass over the same reviews."""
+    sentiment: Sentiment = Field(description="Sentiment analysis result")
+    aspects: AspectAnalysis = Field(description="Aspect analysis result")
+    jtbd: JTBD = Field(description="Jobs-to-Be-Done analysis result")
\ No newline at end of file
@@ -12,30 +12,81 @@ AGENT_SYSTEM_PROMPT = load_prompt('agent_system.txt')
 JTBD_ANALYSIS_PROMPT = load_prompt('jtbd_analysis.txt')
 ASPECTS_ANALYSIS_PROMPT = load_prompt('aspects_analysis.txt')
 SENTIMENT_ANALYSIS_PROMPT = load_prompt('sentiment_analysis.txt')
+COMBINED_ANALYSIS_PROMPT = load_prompt('combined_analysis.txt')
+
+# Templates are immutable, so each is built once at import
+_RAG_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", RAG_SYSTEM_PROMPT),
+    ("human", "Question: {question}")
+])
+_SENTIMENT_HUMAN = "You may use this human question to help you analyze the sentiment of the reviews: {question}"
+_ASPECTS_HUMAN = "You may use this human question to help you analyze the aspects of the reviews: {question}"
+_JTBD_HUMAN = "You may use this human question to help you analyze the JTBD of the reviews: {question}"
+_COMBINED_HUMAN = "You may use this human question to help you analyze the sentiment, aspects and JTBD of the reviews: {question}"
+_SENTIMENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SENTIMENT_ANALYSIS_PROMPT),
+    ("human", _SENTIMENT_HUMAN)
+])
+_ASPECTS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", ASPECTS_ANALYSIS_PROMPT),
+    ("human", _ASPECTS_HUMAN)
+])
+_JTBD_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", JTBD_ANALYSIS_PROMPT),
+    ("human", _JTBD_HUMAN)
+])
+_COMBINED_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", COMBINED_ANALYSIS_PROMPT),
+    ("human", _COMBINED_HUMAN)
+])
 
 def get_rag_prompt():
-    return ChatPromptTemplate.from_messages([
-        ("system", RAG_SYSTEM_PROMPT),
-        ("human", "Question: {question}")
-    ])
+    return _RAG_PROMPT
+
+def render_rag_prompt(context, question):
+    """Render the RAG prompt as text, same output as get_rag_prompt().format().
+
+    Plain str.format on the preloaded template skips ChatPromptTemplate's
+    per-call input validation and message building.
+    """
+    system = RAG_SYSTEM_PROMPT.format(context=context)
+    return f"System: {system}\nHuman: Question: {question}"
 
 def get_agent_prompt():
     return AGENT_SYSTEM_PROMPT
 
 def get_sentiment_prompt():
-    return ChatPromptTemplate.from_messages([
-        ("system", SENTIMENT_ANALYSIS_PROMPT),
-        ("human", "You may use this human question to help you analyze the sentiment of the reviews: {question}")
-    ])
+    return _SENTIMENT_PROMPT
 
 def get_aspects_prompt():
-    return ChatPromptTemplate.from_messages([
-        ("system", ASPECTS_ANALYSIS_PROMPT),
-        ("human", "You may use this human question to help you analyze the aspects of the reviews: {question}")
-    ])
+    return _ASPECTS_PROMPT
 
 def get_jtbd_prompt():
-    return ChatPromptTemplate.from_messages([
-        ("system", JTBD_ANALYSIS_PROMPT),
-        ("human", "You may use this human question to help you analyze the JTBD of the reviews: {question}")
-    ])
\ No newline at end of file
+    return _JTBD_PROMPT
+
+def get_combined_prompt():
+    return _COMBINED_PROMPT
+
+def _render_analysis_prompt(system, human, reviews, question):
+    """Render an analysis prompt as text, same output as the template's .format().
+
+    The reviews payload is substituted once with str.format, without
+    ChatPromptTemplate's per-call validation and message objects.
+    """
+    return f"System: {system.format(reviews=reviews)}\nHuman: {human.format(question=question)}"
+
+def render_sentiment_prompt(reviews, question):
+    return _render_analysis_prompt(SENTIMENT_ANALYSIS_PROMPT, _SENTIMENT_HUMAN, reviews, question)
+
+def render_aspects_prompt(reviews, question):
+    return _render_analysis_prompt(ASPECTS_ANALYSIS_PROMPT, _ASPECTS_HUMAN, reviews, question)
+
+def render_jtbd_prompt(reviews, question):
+    return _render_analysis_prompt(JTBD_ANALYSIS_PROMPT, _JTBD_HUMAN, reviews, question)
+
+def render_combined_prompt(reviews, question, sections=None):
+    prompt = _render_analysis_prompt(COMBINED_ANALYSIS_PROMPT, _COMBINED_HUMAN, reviews, question)
+    if sections:
+        # Appended after the question so the system block stays the same for every subset
+        prompt += f"\nOnly produce these analyses: {', '.join(sections)}."
+    return prompt
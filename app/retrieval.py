@@ -1,53 +1,117 @@
-from typing import Optional, Dict, List, Any
-from langchain_core.retrievers import BaseRetriever
-from clients import get_vector_store
+from typing import Optional, Dict, List, Any, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+import threading
+import time
+import numpy as np
+from clients import get_collection, get_embeddings
+from semantic_cache import SemanticCache
 
 
 TOP_K = 12  # number of results to return
 FETCH_K = 30  # Consider FETCH_K results, then diversify to TOP_K
 LAMBDA_MMR = 0.5  # 0 - 1 (0 = most diverse, 1 = most relevant)
+MAX_FETCH_FACTOR = 5  # Cap candidate pool at MAX_FETCH_FACTOR × top_k
+RETRIEVAL_CACHE_TTL = 600  # seconds before cached retrieval results are refreshed
+RETRIEVAL_CACHE_THRESHOLD = 0.97  # minimum cosine similarity to reuse results for a paraphrase
+EMBED_CACHE_SIZE = 256  # query embeddings kept per process
 
+# Paraphrased queries with the same filters reuse earlier candidates and MMR ranking
+_retrieval_cache = SemanticCache(max_entries=128, threshold=RETRIEVAL_CACHE_THRESHOLD, ttl=RETRIEVAL_CACHE_TTL)
 
-def create_retriever(
-    query: str,
-    chunk_type: str = "sentence",
-    vendor: Optional[str] = None,
-    top_k: Optional[int] = None,
-    fetch_k: Optional[int] = None
-) -> BaseRetriever:
-    """Dynamically create retrieval query.
+
+def build_filter(chunk_type: str = "sentence", vendor: Optional[str] = None) -> Dict[str, Any]:
+    """Build the Chroma metadata filter for chunk type and optional vendor."""
+    if vendor:
+        return {"$and": [{"chunk_type": chunk_type}, {"vendor": vendor}]}
+    return {"chunk_type": chunk_type}
+
+# Query embeddings (LRU); shared by tool threads, so guarded by a lock
+_embedding_cache = OrderedDict()
+_embedding_lock = threading.Lock()
+
+def embed_queries(questions: List[str]) -> List[Tuple[float, ...]]:
+    """Embed queries, sending every uncached one in a single embeddings request.
+
+    Lets the agent embed all retrieve_reviews questions of one turn in one round trip.
+    """
+    unique = list(dict.fromkeys(questions))
+    with _embedding_lock:
+        found = {q: _embedding_cache[q] for q in unique if q in _embedding_cache}
+        for question in found:
+            _embedding_cache.move_to_end(question)
+
+    missing = [q for q in unique if q not in found]
+    if missing:
+        vectors = get_embeddings().embed_documents(missing)
+        fresh = {question: tuple(vector) for question, vector in zip(missing, vectors)}
+        with _embedding_lock:
+            _embedding_cache.update(fresh)
+            while len(_embedding_cache) > EMBED_CACHE_SIZE:
+                _embedding_cache.popitem(last=False)
+        found.update(fresh)
+
+    return [found[q] for q in questions]
+
+def embed_query(question: str) -> Tuple[float, ...]:
+    """Embed a query once per process; repeats (cache lookups, tool re-retrievals) reuse it."""
+    return embed_queries([question])[0]
+
+def mmr_select(
+    query_embedding: List[float],
+    candidate_embeddings: Any,
+    k: int,
+    lambda_mult: float = LAMBDA_MMR
+) -> List[int]:
+    """Select candidates by Maximal Marginal Relevance.
+
+    Query and candidate-candidate cosine similarities are computed with one
+    matrix product each; the greedy loop only updates a running max-similarity vector.
 
     Args:
-        query: Search query for vector similarity
-        chunk_type: Type of chunks to retrieve ("sentence" or "review")
-        vendor: Optional vendor filter
-        top_k: Number of results to return (defaults to TOP_K)
-        fetch_k: Number of candidates for MMR (defaults to FETCH_K)
+        query_embedding: Query vector
+        candidate_embeddings: Candidate vectors, shape (n, d)
+        k: Number of candidates to select
+        lambda_mult: Relevance/diversity trade-off (defaults to LAMBDA_MMR)
 
     Returns:
-        Configured retriever with MMR search and metadata filtering
+        Indices of selected candidates in selection order
     """
-    vector_store = get_vector_store()
-    filters = {"chunk_type": chunk_type}
-    if vendor:
-        filters["vendor"] = vendor
-    else:
-        filters.pop("vendor", None)
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.ndim != 2 or len(candidates) == 0 or k <= 0:
+        return []
 
-    if len(filters) > 1:
-        filter_query = {"$and": [{k: v} for k, v in filters.items()]}
-    else:
-        filter_query = filters
-
-    return vector_store.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": top_k or TOP_K,
-            "fetch_k": fetch_k or FETCH_K,
-            "lambda_mult": LAMBDA_MMR,
-            "filter": filter_query
-        }
-    )
+    query = np.asarray(query_embedding, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    sim_query = candidates @ query
+    sim_candidates = candidates @ candidates.T
+
+    selected = [int(np.argmax(sim_query))]
+    max_sim = sim_candidates[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * sim_query - (1 - lambda_mult) * max_sim
+        scores[~available] = -np.inf
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+        available[idx] = False
+        np.maximum(max_sim, sim_candidates[idx], out=max_sim)
+
+    return selected
+
+# Set once the collection has data; only an empty index pays a count() per query
+_index_populated = False
+
+def index_is_empty() -> bool:
+    """True while the reviews collection has no documents (not ingested yet)."""
+    global _index_populated
+    if not _index_populated:
+        _index_populated = get_collection().count() > 0
+    return not _index_populated
 
 def retrieve_documents(
     question: str,
@@ -58,45 +122,103 @@ def retrieve_documents(
 ) -> List[Dict[str, Any]]:
     """Retrieve documents as structured objects.
 
+    Sentence chunks: fetches fetch_k candidates with their embeddings in a single
+    Chroma query, then diversifies to top_k with mmr_select. Review chunks: plain
+    top_k nearest neighbours (fetch_k is not used). Results are cached per argument
+    tuple for RETRIEVAL_CACHE_TTL seconds, and paraphrased questions with the
+    same filters reuse them (cosine >= RETRIEVAL_CACHE_THRESHOLD).
+
     Args:
         question: Search query for retrieval
         chunk_type: Type of chunks to retrieve ("sentence" or "review")
         vendor: Optional vendor filter
         top_k: Number of results to return (defaults to TOP_K constant)
-        fetch_k: Number of candidates for MMR (defaults to FETCH_K constant)
+        fetch_k: Number of candidates for MMR (defaults to FETCH_K constant, capped at MAX_FETCH_FACTOR × top_k)
 
     Returns:
         List of snippet dictionaries with keys: text, rating, date, source, vendor, review_header
     """
-    retriever = create_retriever(question, chunk_type, vendor, top_k, fetch_k)
-    docs = retriever.invoke(question)
-    if not docs:
+    top_k = top_k or TOP_K
+    fetch_k = max(top_k, min(fetch_k or FETCH_K, top_k * MAX_FETCH_FACTOR))
+
+    if index_is_empty():
+        # Not ingested yet: checked before the cache so data is found as soon as it lands
         return []
 
+    ttl_bucket = int(time.monotonic() // RETRIEVAL_CACHE_TTL)
+    cached = _cached_query(question, chunk_type, vendor, top_k, fetch_k, ttl_bucket)
+    # Copy so callers can mutate snippets without touching the cache
+    return [dict(doc) for doc in cached]
+
+@lru_cache(maxsize=128)
+def _cached_query(
+    question: str,
+    chunk_type: str,
+    vendor: Optional[str],
+    top_k: int,
+    fetch_k: int,
+    ttl_bucket: int
+) -> Tuple[Dict[str, Any], ...]:
+    """Cached wrapper around _query_documents; ttl_bucket expires entries."""
+    return tuple(_query_documents(question, chunk_type, vendor, top_k, fetch_k))
+
+def _query_documents(
+    question: str,
+    chunk_type: str,
+    vendor: Optional[str],
+    top_k: int,
+    fetch_k: int
+) -> List[Dict[str, Any]]:
+    """Query Chroma for candidates and rerank them with MMR."""
+    collection = get_collection()
+    query_embedding = embed_query(question)
+    cache_scope = (chunk_type, vendor, top_k, fetch_k)
+    cached = _retrieval_cache.get(cache_scope, query_embedding)
+    if cached is not None:
+        return list(cached)
+
+    # Full reviews are one chunk per review, so plain k-NN is used; MMR only
+    # diversifies sentence chunks, which cluster around the same reviews
+    diversify = chunk_type != "review"
+    results = collection.query(
+        query_embeddings=[list(query_embedding)],
+        n_results=fetch_k if diversify else top_k,
+        where=build_filter(chunk_type, vendor),
+        include=["documents", "metadatas", "embeddings"] if diversify else ["documents", "metadatas"]
+    )
+    texts = results["documents"][0] if results.get("documents") else []
+    if not texts:
+        return []
+    metadatas = results["metadatas"][0]
+    if diversify:
+        selected = mmr_select(query_embedding, results["embeddings"][0], top_k)
+    else:
+        selected = range(len(texts))
+
     # Deduplicate by review_id to avoid multiple chunks from the same review
     seen_review_ids = set()
-    unique_docs = []
-    for doc in docs:
-        review_id = doc.metadata.get('review_id')
-        if review_id not in seen_review_ids:
-            seen_review_ids.add(review_id)
-            unique_docs.append(doc)
-
     processed_docs = []
-    for doc in unique_docs:
-        metadata = doc.metadata
-        processed_doc = {
-            "text": doc.page_content,
-            "rating": metadata.get("score", 0),
-            "date": metadata.get("date", ""),
-            "source": metadata.get("name", "Anonymous"),
-            "vendor": metadata.get("vendor", ""),
-            "review_header": metadata.get("review_header", "")
-        }
-        processed_docs.append(processed_doc)
-
+    for idx in selected:
+        get = (metadatas[idx] or {}).get
+        review_id = get('review_id')
+        if review_id in seen_review_ids:
+            continue
+        seen_review_ids.add(review_id)
+        processed_docs.append({
+            "text": texts[idx].strip(),
+            "rating": get("score", 0),
+            "date": get("date", ""),
+            "source": get("name", "Anonymous"),
+            "vendor": get("vendor", ""),
+            "review_header": get("review_header", "")
+        })
+
+    _retrieval_cache.put(cache_scope, query_embedding, tuple(processed_docs))
     return processed_docs
 
+# Prompt line per snippet; texts are already stripped by _query_documents
+_SNIPPET_LINE = "[{source} | {date} | Score: {rating}] {text}".format
+
 def format_snippets_to_text(snippets: List[Dict[str, Any]]) -> str:
     """Format snippet objects to text for a simple RAG workflow.
 
@@ -109,9 +231,12 @@ def format_snippets_to_text(snippets: List[Dict[str, Any]]) -> str:
     if not snippets:
         return "No relevant reviews found."
 
-    formatted = []
-    for snippet in snippets:
-        source_line = f"{snippet['source']} | {snippet['date'] or 'Unknown date'} | Score: {snippet['rating'] or 'N/A'}"
-        formatted.append(f"[{source_line}] {snippet['text'].strip()}")
-
-    return "\n\n".join(formatted)
\ No newline at end of file
+    return "\n\n".join(
+        _SNIPPET_LINE(
+            source=snippet['source'],
+            date=snippet['date'] or 'Unknown date',
+            rating=snippet['rating'] or 'N/A',
+            text=snippet['text'],
+        )
+        for snippet in snippets
+    )
\ No newline at end of file
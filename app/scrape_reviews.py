@@ -1,7 +1,14 @@
+import csv
+import json
+import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
+import soupsieve as sv
 
 HEADERS = {
     "User-Agent": (
@@ -11,33 +18,49 @@ HEADERS = {
     ),
     "Accept-Language": "en-US,en;q=0.9",
 }
+COLUMNS = ("name", "country", "date", "review_score", "review_header", "review_body")
+# Last page with reviews per base_url, remembered between runs (same file from any CWD)
+PAGE_CACHE_PATH = Path(__file__).resolve().parent.parent / "data" / ".scrape_pages.json"
+
+# CSS selectors compiled once instead of per card on every page
+_SCOPE_SEL = sv.compile('section.styles_reviewListContainer__2bg_p[data-nosnippet="false"]')
+_CARD_SEL = sv.compile('div[data-testid="service-review-card-v2"]')
+_HEADER_SEL = sv.compile('div.styles_reviewCardInnerHeader__8Xqy8')
+_NAME_SEL = sv.compile('[data-consumer-name-typography="true"]')
+_COUNTRY_SEL = sv.compile('[data-consumer-country-typography="true"]')
+_TIME_SEL = sv.compile('time[data-service-review-date-time-ago="true"], time')
+_SCORE_SEL = sv.compile('img.CDS_StarRating_starRating__614d2e')
+_BODY_SEL = sv.compile('div.styles_reviewContent__tuXiN[data-review-content="true"]')
+_TITLE_SEL = sv.compile('h2[data-service-review-title-typography="true"]')
+_TEXT_SEL = sv.compile('p[data-service-review-text-typography="true"]')
+# Star count from the rating image src, e.g. .../stars/stars-5.svg
+_STARS_RE = re.compile(r"stars-(\d+)")
 
 def _clean(s):
     return " ".join(s.split()) if s else ""
 
 def _parse_reviews(html):
     s = BeautifulSoup(html, "html.parser")
-    scope = s.select_one('section.styles_reviewListContainer__2bg_p[data-nosnippet="false"]') or s
+    scope = _SCOPE_SEL.select_one(s) or s
     rows = []
-    for card in scope.select('div[data-testid="service-review-card-v2"]'):
+    for card in _CARD_SEL.select(scope):
         try:
-            header = card.select_one('div.styles_reviewCardInnerHeader__8Xqy8')
-            name = _clean(header.select_one('[data-consumer-name-typography="true"]').get_text(strip=True)) if header else ""
-            country = _clean(header.select_one('[data-consumer-country-typography="true"]').get_text(strip=True)) if header else ""
-            t = header.select_one('time[data-service-review-date-time-ago="true"], time') if header else None
+            header = _HEADER_SEL.select_one(card)
+            name = _clean(_NAME_SEL.select_one(header).get_text(strip=True)) if header else ""
+            country = _clean(_COUNTRY_SEL.select_one(header).get_text(strip=True)) if header else ""
+            t = _TIME_SEL.select_one(header) if header else None
             date_txt = _clean(t.get_text(strip=True) if t else "") or _clean(t.get("title") if t else "") or _clean(t.get("datetime") if t else "")
 
-            score_el = card.select_one('img.CDS_StarRating_starRating__614d2e')
+            score_el = _SCORE_SEL.select_one(card)
             review_score = ""
             if score_el and score_el.get("src"):
-                # src example: .../stars/stars-5.svg
-                src = score_el["src"]
-                if "stars-" in src:
-                    review_score = src.split("stars-")[-1].split(".")[0]
+                m = _STARS_RE.search(score_el["src"])
+                if m:
+                    review_score = m.group(1)
 
-            body = card.select_one('div.styles_reviewContent__tuXiN[data-review-content="true"]') or card
-            title = body.select_one('h2[data-service-review-title-typography="true"]')
-            text = body.select_one('p[data-service-review-text-typography="true"]')
+            body = _BODY_SEL.select_one(card) or card
+            title = _TITLE_SEL.select_one(body)
+            text = _TEXT_SEL.select_one(body)
 
             rows.append({
                 "name": name,
@@ -53,40 +76,120 @@ def _parse_reviews(html):
     print(f"Scraped {len(rows)} reviews")
     return rows
 
-def _iter_pages(base_url, max_pages, delay, timeout):
+def _load_page_cache(path):
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_page_cache(cache, path):
+    # Write then rename so an interrupted run never leaves a truncated file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(cache, indent=2))
+    tmp_path.replace(path)
+
+def _iter_pages(base_url, max_pages, delay, timeout, workers, known_last=0):
+    """Yield page HTML in order, with up to `workers` requests in flight.
+
+    Request starts are spaced at least `delay` seconds apart across all workers,
+    so concurrency overlaps response latency without raising the request rate.
+    No page is requested once a 404 (end of listing) has been seen; iteration
+    stops there or after max_pages. Every run still fetches pages 1..N+1. When
+    the previous run's last page is known, pages past the page after it are
+    requested one at a time, so the end of the listing is overshot by at most
+    one request.
+    """
     session = requests.Session()
     session.headers.update(HEADERS)
-    page = 1
-    scraped = 0
-    while True:
+    finished = threading.Event()  # set on a 404 or when the caller stops iterating
+    rate_lock = threading.Lock()
+    next_start = time.monotonic()
+
+    def fetch(page):
+        nonlocal next_start
+        with rate_lock:
+            now = time.monotonic()
+            start_at = max(now, next_start)
+            next_start = start_at + delay
+        if start_at > now:
+            time.sleep(start_at - now)
+        if finished.is_set():
+            return None
         r = session.get(f"{base_url}?page={page}", timeout=timeout)
         if r.status_code == 404:
-            return
-        r.raise_for_status()
-        yield r.text
-        scraped += 1
-        if max_pages and scraped >= max_pages:
-            return
-        page += 1
-        if delay:
-            time.sleep(delay)
+            finished.set()
+        return r
+
+    pending = deque()
+    page = 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                limit = workers if not known_last or page <= known_last + 1 else 1
+                while (
+                    len(pending) < limit
+                    and not finished.is_set()
+                    and (not max_pages or page <= max_pages)
+                ):
+                    pending.append(executor.submit(fetch, page))
+                    page += 1
+                if not pending:
+                    return
+                r = pending.popleft().result()
+                if r is None or r.status_code == 404:
+                    return
+                r.raise_for_status()
+                yield r.text
+        finally:
+            # Set before the executor joins, so queued fetches return without requesting
+            finished.set()
 
 def scrape_reviews_paginated(
     base_url="https://www.trustpilot.com/review/scaleway.com",
+    output_path="data/reviews/reviews.csv",
     max_pages=None,
     delay_seconds=2,
     timeout=20,
+    workers=4,
+    page_cache_path=PAGE_CACHE_PATH,
 ):
-    rows = []
-    for html in _iter_pages(base_url, max_pages, delay_seconds, timeout):
-        page_rows = _parse_reviews(html)
-        if not page_rows:
-            break
-        rows.extend(page_rows)
+    """Scrape all review pages, streaming each page's rows to output_path as it is parsed.
+
+    Rows go to a temporary file that replaces output_path only once the scrape
+    finishes, so a failed or interrupted run leaves the previous CSV intact.
+    The last page found per base_url is kept in page_cache_path to shorten the next run.
+    Returns the number of reviews written.
+    """
+    page_cache = _load_page_cache(page_cache_path)
+    known_last = page_cache.get(base_url, 0)
+    total = 0
+    pages = 0
+    output_path = Path(output_path)
+    tmp_path = output_path.with_suffix(".tmp")
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS, lineterminator="\n")
+            writer.writeheader()
+            for html in _iter_pages(base_url, max_pages, delay_seconds, timeout, workers, known_last):
+                page_rows = _parse_reviews(html)
+                if not page_rows:
+                    break
+                writer.writerows(page_rows)
+                total += len(page_rows)
+                pages += 1
+        tmp_path.replace(output_path)
+    except BaseException:
+        # Includes KeyboardInterrupt: drop the partial file, keep the old CSV
+        tmp_path.unlink(missing_ok=True)
+        raise
 
-    return {k: [r[k] for r in rows] for k in ("name", "country", "date", "review_score", "review_header", "review_body")}
+    # A max_pages run only proves a lower bound, so never shrink the known count
+    if pages > known_last or (pages and not max_pages):
+        page_cache[base_url] = pages
+        _save_page_cache(page_cache, page_cache_path)
+    return total
 
 
-data = scrape_reviews_paginated()
-df = pd.DataFrame(data=data)
-df.to_csv("data/reviews/reviews.csv", index=False, encoding="utf-8")
+scrape_reviews_paginated()
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+import threading
+import time
+import numpy as np
+
+
+class SemanticCache:
+    """In-process LRU cache keyed on query embeddings.
+
+    A lookup hits when a stored entry with the same scope (e.g. retrieval
+    filters) has cosine similarity >= threshold to the query embedding.
+    Entries expire after ttl seconds so re-ingested data is picked up.
+    """
+
+    def __init__(self, max_entries: int = 256, threshold: float = 0.95, ttl: float = 600):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._entries = OrderedDict()  # entry id -> (scope, unit vector, value, created_at)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, scope: Hashable, embedding: List[float]) -> Optional[Any]:
+        """Return the cached value closest to embedding within scope, or None."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired entries (oldest first, insertion order)
+            for entry_id in [i for i, e in self._entries.items() if now - e[3] > self.ttl]:
+                del self._entries[entry_id]
+
+            ids = [i for i, e in self._entries.items() if e[0] == scope]
+            if not ids:
+                return None
+
+            matrix = np.stack([self._entries[i][1] for i in ids])
+            sims = matrix @ query
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+
+            self._entries.move_to_end(ids[best])
+            return self._entries[ids[best]][2]
+
+    def put(self, scope: Hashable, embedding: List[float], value: Any) -> None:
+        """Store value for embedding within scope, evicting the least recently used entry."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._entries[self._next_id] = (scope, vector, value, time.monotonic())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
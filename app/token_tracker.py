@@ -1,31 +1,70 @@
 # token_tracker.py
+import threading
 import streamlit as st
+import tiktoken
 from langchain_core.callbacks.base import BaseCallbackHandler
 
+# Tokenizer matching the chat model (lazy loading); False once loading has failed
+_encoding = None
+CHARS_PER_TOKEN = 4  # Estimate used when the tokenizer is unavailable
+
+def get_encoding():
+    """Tokenizer for the chat model, or None if it cannot be loaded.
+
+    tiktoken fetches the encoding file on first use (the Docker image prefetches it);
+    a failed load, e.g. offline with a cold cache, is not retried on every call.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+        except Exception as e:
+            print(f"Tokenizer unavailable, estimating token counts: {e}")
+            _encoding = False
+    return _encoding or None
+
+def count_tokens(texts):
+    """Count tokens for each text with a single batched tokenizer call.
+
+    Falls back to a len(text) // CHARS_PER_TOKEN estimate when the tokenizer is unavailable.
+    """
+    if not texts:
+        return []
+    texts = list(texts)
+    encoding = get_encoding()
+    if encoding is not None:
+        try:
+            return [len(tokens) for tokens in encoding.encode_batch(texts)]
+        except Exception:
+            pass
+    return [len(text) // CHARS_PER_TOKEN for text in texts]
+
 class TokenTracker(BaseCallbackHandler):
 
     def __init__(self, max_tokens=100000):
         self.max_tokens = max_tokens
-        if 'tokens' not in st.session_state:
-            st.session_state.tokens = 0
+        # Tools may run concurrently, so LLM callbacks can arrive from several threads
+        self._lock = threading.Lock()
+        # One instance serves all sessions; counts default to 0 per session
 
     def on_llm_end(self, response, **kwargs):
         """Auto-track tokens from LLM."""
         if hasattr(response, 'llm_output') and response.llm_output is not None:
             tokens = response.llm_output.get('token_usage', {}).get('total_tokens', 0)
-            st.session_state.tokens += tokens
+            with self._lock:
+                st.session_state.tokens = st.session_state.get('tokens', 0) + tokens
 
     @property
     def used(self):
-        return st.session_state.tokens
+        return st.session_state.get('tokens', 0)
 
     @property
     def remaining(self):
-        return self.max_tokens - st.session_state.tokens
+        return self.max_tokens - self.used
 
     @property
     def is_exceeded(self):
-        return st.session_state.tokens >= self.max_tokens
+        return self.used >= self.max_tokens
 
     def reset(self):
         st.session_state.tokens = 0
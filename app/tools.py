@@ -1,50 +1,303 @@
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional
+from collections import OrderedDict
+from functools import lru_cache, partial
+import hashlib
+import threading
+import time
 from langchain.tools import tool
-from clients import get_llm
-from prompts import get_jtbd_prompt, get_aspects_prompt, get_sentiment_prompt
-from models import JTBD, AspectAnalysis, Sentiment, Snippet, RetrievalResult, RetrievalInput, ToolInput
-from retrieval import retrieve_documents
-import json
+from clients import get_llm, get_snippet_store_connection, SNIPPET_STORE_RETENTION
+from prompts import render_jtbd_prompt, render_aspects_prompt, render_sentiment_prompt, render_combined_prompt
+from models import JTBD, AspectAnalysis, Sentiment, CombinedAnalysis, Snippet, RetrievalInput, ToolInput, CombinedToolInput
+from pydantic import TypeAdapter, create_model
+from retrieval import retrieve_documents, embed_query
+from semantic_cache import SemanticCache
+import orjson
+
+
+# Same snippets + paraphrased question reuse the earlier analysis
+ANALYSIS_CACHE_THRESHOLD = 0.95  # minimum cosine similarity between questions for a cache hit
+_analysis_cache = SemanticCache(max_entries=256, threshold=ANALYSIS_CACHE_THRESHOLD)
+# Exact (scope, question) repeats, e.g. retried tool calls, hit before any embedding lookup
+EXACT_CACHE_SIZE = 256
+_exact_analysis_cache = OrderedDict()
+_exact_analysis_lock = threading.Lock()
+
+# Validates/dumps a whole retrieval result in one pydantic-core call
+_SNIPPET_LIST = TypeAdapter(List[Snippet])
+
+# Normalized snippets per retrieval_id, so analysis tools can reference a retrieval
+# instead of the LLM copying every snippet into their arguments. An in-process LRU
+# sits in front of a SQLite table that survives restarts; the lock only guards the LRU.
+SNIPPET_STORE_SIZE = 128  # retrievals kept in memory
+_snippet_store = OrderedDict()
+_snippet_store_lock = threading.Lock()
+
+LLM_SNIPPET_BUDGET = 12_000  # max snippet characters per analysis prompt (~3k tokens)
+DEDUPE_PREFIX_CHARS = 200  # snippets sharing this many leading characters count as duplicates
+
+
+def _normalize_snippet(item: Any) -> Dict[str, Any] | None:
+    """Normalize one snippet, or return None if it has no usable text."""
+    if isinstance(item, Snippet):
+        # Tool args arrive validated as Snippet models: read fields, skip model_dump()
+        text, rating = item.text, item.rating
+    elif isinstance(item, dict):
+        text, rating = item.get("text"), item.get("rating")
+    elif isinstance(item, str):
+        text, rating = item, None
+    elif hasattr(item, "model_dump"):
+        try:
+            return _normalize_snippet(item.model_dump())
+        except Exception:
+            return None
+    else:
+        return None
+
+    if not isinstance(text, str):
+        return None
+    text = text.strip()
+    if not text:
+        return None
+    return {"text": text} if rating is None else {"text": text, "rating": rating}
 
 
 def _normalize_snippets(snippets: Union[List[str], List[Dict[str, Any]], List[Any]]) -> List[Dict[str, Any]]:
-    """Normalize snippet inputs to a uniform list of dicts with keys 'text' and 'rating'.
+    """Normalize snippet inputs to the lean {'text', 'rating'} payload sent to the LLM.
 
-    - Accepts a list of strings or dicts; ignores empty/invalid items
-    - For strings: maps to {"text": <str>, "rating": None}
-    - For dicts: preserves 'text' and 'rating' if available
-    - For Pydantic models (e.g., Snippet), uses model_dump()
+    - Accepts a list of strings, dicts or Snippet models; ignores empty/invalid items
+    - For strings: maps to {"text": <str>}
+    - For dicts and Snippets: keeps 'text', and 'rating' only when present (prompts treat it as optional)
+    - For other Pydantic models, uses model_dump()
 
     Args:
         snippets: Mixed list of strings, dicts, or Pydantic models
 
     Returns:
-        Normalized list of dictionaries with 'text' and 'rating' keys
+        Normalized list of dictionaries with a 'text' key and an optional 'rating' key
     """
-    normalized = []
     if not isinstance(snippets, list):
-        return normalized
-    for item in snippets:
-        if hasattr(item, "model_dump") and callable(getattr(item, "model_dump")):
-            try:
-                item = item.model_dump()
-            except Exception:
-                item = {}
-        if isinstance(item, str):
-            text = item.strip()
-            if text:
-                normalized.append({"text": text, "rating": None})
-        elif isinstance(item, dict):
-            text = item.get("text")
-            if isinstance(text, str) and text.strip():
-                normalized.append({"text": text.strip(), "rating": item.get("rating")})
-    return normalized
+        return []
+    return [snippet for snippet in map(_normalize_snippet, snippets) if snippet is not None]
+
+
+def _prepare_for_llm(snippets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop duplicate snippets and cap the total text at LLM_SNIPPET_BUDGET characters.
+
+    Snippets keep their retrieval (relevance/MMR) order, so the budget trims the
+    least relevant ones; the first snippet is always kept.
+    """
+    seen = set()
+    prepared = []
+    used = 0
+    for snippet in snippets:
+        key = " ".join(snippet["text"][:DEDUPE_PREFIX_CHARS].lower().split())
+        if key in seen:
+            continue
+        if prepared and used + len(snippet["text"]) > LLM_SNIPPET_BUDGET:
+            break
+        seen.add(key)
+        prepared.append(snippet)
+        used += len(snippet["text"])
+    return prepared
+
+
+def _snippets_json(snippets: List[Dict[str, Any]]) -> str:
+    """Serialize normalized snippets for prompt injection.
+
+    orjson emits compact JSON with raw UTF-8, keeping the payload (and prompt tokens) small.
+    """
+    return orjson.dumps(snippets).decode()
+
+
+@lru_cache(maxsize=None)
+def _structured_llm(schema):
+    """Structured-output runnable per result model, built once per process."""
+    return get_llm().with_structured_output(schema)
+
+
+def _snippets_digest(snippets: List[Dict[str, Any]]) -> str:
+    """Order-independent sha256 of normalized snippets."""
+    canonical = orjson.dumps(sorted(snippets, key=lambda s: s["text"]), option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def _remember_snippets(retrieval_id: str, snippets: List[Dict[str, Any]]) -> None:
+    """Put snippets in the in-memory LRU, evicting the least recently used."""
+    with _snippet_store_lock:
+        _snippet_store[retrieval_id] = snippets
+        _snippet_store.move_to_end(retrieval_id)
+        while len(_snippet_store) > SNIPPET_STORE_SIZE:
+            _snippet_store.popitem(last=False)
+
+
+def _store_snippets(snippets: List[Dict[str, Any]]) -> str:
+    """Keep normalized snippets under a content-derived retrieval_id and return the id."""
+    retrieval_id = _snippets_digest(snippets)[:16]
+    _remember_snippets(retrieval_id, snippets)
+    try:
+        with get_snippet_store_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO retrievals (retrieval_id, snippets, created_at) VALUES (?, ?, ?)",
+                (retrieval_id, orjson.dumps(snippets), time.time()),
+            )
+    except Exception as e:
+        # The id still resolves from memory until evicted
+        print(f"Error persisting retrieval {retrieval_id}: {e}")
+    return retrieval_id
+
+
+def _load_snippets(retrieval_id: str) -> List[Dict[str, Any]] | None:
+    """Stored snippets for retrieval_id from memory or SQLite, or None if unknown."""
+    with _snippet_store_lock:
+        stored = _snippet_store.get(retrieval_id)
+        if stored is not None:
+            _snippet_store.move_to_end(retrieval_id)
+            return stored
+    try:
+        row = get_snippet_store_connection().execute(
+            "SELECT snippets FROM retrievals WHERE retrieval_id = ? AND created_at >= ?",
+            (retrieval_id, time.time() - SNIPPET_STORE_RETENTION),
+        ).fetchone()
+    except Exception as e:
+        print(f"Error loading retrieval {retrieval_id}: {e}")
+        return None
+    if row is None:
+        return None
+    stored = orjson.loads(row[0])
+    _remember_snippets(retrieval_id, stored)
+    return stored
+
+
+def _resolve_snippets(snippets: Optional[List[Any]], retrieval_id: Optional[str]) -> List[Dict[str, Any]]:
+    """Snippets stored for retrieval_id, or the snippets passed in.
+
+    Raises:
+        ValueError: retrieval_id is unknown or expired and no snippets were passed
+    """
+    if retrieval_id:
+        stored = _load_snippets(retrieval_id)
+        if stored is not None:
+            return stored
+        if not snippets:
+            raise ValueError(f"retrieval_id {retrieval_id} expired; call retrieve_reviews again")
+    return _normalize_snippets(snippets or [])
+
+
+COMBINED_SECTIONS = ("sentiment", "aspects", "jtbd")  # CombinedAnalysis fields, in output order
+
+
+@lru_cache(maxsize=None)
+def _combined_schema(sections: tuple):
+    """CombinedAnalysis, or a model with only the requested section fields.
+
+    Unrequested analyses are left out of the schema, so the model never generates them.
+    """
+    if sections == COMBINED_SECTIONS:
+        return CombinedAnalysis
+    fields = {name: (CombinedAnalysis.model_fields[name].annotation, CombinedAnalysis.model_fields[name]) for name in sections}
+    return create_model(f"CombinedAnalysis_{'_'.join(sections)}", __doc__=CombinedAnalysis.__doc__, **fields)
+
+
+def _analysis_scope(schema, snippets: List[Dict[str, Any]]) -> tuple:
+    """Cache scope: result model plus an order-independent hash of the snippets."""
+    return schema.__name__, _snippets_digest(snippets)
+
+
+def _remember_exact(key: tuple, response) -> None:
+    """Store an analysis result for exact (scope, question) lookups, evicting the oldest."""
+    with _exact_analysis_lock:
+        _exact_analysis_cache[key] = response
+        _exact_analysis_cache.move_to_end(key)
+        while len(_exact_analysis_cache) > EXACT_CACHE_SIZE:
+            _exact_analysis_cache.popitem(last=False)
+
+
+def _analyze(snippets: List[Dict[str, Any]], question: str, render_prompt, schema):
+    """Render an analysis prompt with the snippets and parse the reply into schema.
+
+    Results are cached per snippet set: exact repeats hit an in-process LRU first,
+    and a paraphrased question hits the semantic cache.
+    """
+    scope = _analysis_scope(schema, snippets)
+    exact_key = (scope, question)
+    with _exact_analysis_lock:
+        cached = _exact_analysis_cache.get(exact_key)
+        if cached is not None:
+            _exact_analysis_cache.move_to_end(exact_key)
+            return cached
+    try:
+        question_embedding = embed_query(question)
+    except Exception:
+        question_embedding = None  # Cache is best-effort; still run the analysis
+    if question_embedding is not None:
+        cached = _analysis_cache.get(scope, question_embedding)
+        if cached is not None:
+            _remember_exact(exact_key, cached)
+            return cached
+
+    formatted_prompt = render_prompt(_snippets_json(snippets), question)
+    response = _structured_llm(schema).invoke(formatted_prompt)
+    if question_embedding is not None:
+        _analysis_cache.put(scope, question_embedding, response)
+    _remember_exact(exact_key, response)
+    return response
+
+
+def _sentiment_to_dict(response: Sentiment) -> dict:
+    """Convert Sentiment model to the tool output dictionary."""
+    # Check if no reviews were analyzed
+    if response.total_reviews == 0:
+        return {"error": "No review data available for sentiment analysis."}
+
+    return {
+        "total_reviews": response.total_reviews,
+        "mean_rating": response.mean_rating,
+        "positive_share": response.positive_share,
+        "negative_share": response.negative_share,
+        "positive_themes": response.positive_themes,
+        "negative_themes": response.negative_themes
+    }
+
+
+def _aspects_to_dict(response: AspectAnalysis) -> dict:
+    """Convert AspectAnalysis model to the tool output dictionary."""
+    # Check if no aspects were found
+    if response.total_aspects == 0 or not response.aspects:
+        return {"error": "No specific aspects were identified in the reviews."}
+
+    return {
+        "total_aspects": response.total_aspects,
+        "aspects": [
+            {
+                "name": aspect.name,
+                "frequency": aspect.frequency,
+                "sentiment_score": aspect.sentiment_score,
+                "positive_examples": aspect.positive_examples,
+                "neutral_examples": aspect.neutral_examples,
+                "negative_examples": aspect.negative_examples
+            }
+            for aspect in response.aspects
+        ]
+    }
+
+
+def _jtbd_to_dict(response: JTBD, total_reviews: int) -> dict:
+    """Convert JTBD model to the tool output dictionary."""
+    return {
+        "job": response.job,
+        "situation": response.situation,
+        "motivation": response.motivation,
+        "expected_outcome": response.expected_outcome,
+        "frustrations": response.frustrations,
+        "quotes": response.quotes,
+        "total_reviews": total_reviews
+    }
 
 
 @tool("sentiment_analysis", args_schema=ToolInput)
-def summarize_sentiment(snippets: list[str | dict], question: str) -> dict:
+def summarize_sentiment(question: str, snippets: list[str | dict] | None = None, retrieval_id: str | None = None) -> dict:
     """Analyze overall sentiment and emotional tone of customer reviews.
-    Requires snippets from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
+    Requires a retrieval_id (or snippets) from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
 
     Use this tool when the user asks about:
     - Overall sentiment, feelings, or opinions (e.g., "How do customers feel?")
@@ -56,38 +309,21 @@ def summarize_sentiment(snippets: list[str | dict], question: str) -> dict:
     Returns: Dictionary with mean_rating, positive_share, negative_share, and key themes.
     """
     try:
-        snippets = _normalize_snippets(snippets)
+        snippets = _prepare_for_llm(_resolve_snippets(snippets, retrieval_id))
         if not snippets:
             return {"error": "No review data available for sentiment analysis."}
 
-        llm = get_llm()
-        sentiment_prompt = get_sentiment_prompt()
-        formatted_prompt = sentiment_prompt.format(reviews=json.dumps(snippets), question=question)
+        response = _analyze(snippets, question, render_sentiment_prompt, Sentiment)
 
-        # Use structured output with Sentiment model
-        response = llm.with_structured_output(Sentiment).invoke(formatted_prompt)
-
-        # Check if no reviews were analyzed
-        if response.total_reviews == 0:
-            return {"error": "No review data available for sentiment analysis."}
-
-        # Convert Sentiment model to dictionary
-        return {
-            "total_reviews": response.total_reviews,
-            "mean_rating": response.mean_rating,
-            "positive_share": response.positive_share,
-            "negative_share": response.negative_share,
-            "positive_themes": response.positive_themes,
-            "negative_themes": response.negative_themes
-        }
+        return _sentiment_to_dict(response)
 
     except Exception as e:
         return {"error": f"Error analyzing sentiment: {str(e)}"}
 
 @tool("aspect_extraction", args_schema=ToolInput)
-def extract_top_aspects(snippets: list[str | dict], question: str) -> dict:
+def extract_top_aspects(question: str, snippets: list[str | dict] | None = None, retrieval_id: str | None = None) -> dict:
     """Identify and rank specific product/service features mentioned in customer reviews.
-    Requires snippets from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
+    Requires a retrieval_id (or snippets) from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
 
     Use this tool when the user asks about:
     - Specific features or aspects (e.g., "What features do customers discuss?")
@@ -99,44 +335,21 @@ def extract_top_aspects(snippets: list[str | dict], question: str) -> dict:
     Returns: Dictionary with ranked aspects including frequency, sentiment scores, and example quotes.
     """
     try:
-        snippets = _normalize_snippets(snippets)
+        snippets = _prepare_for_llm(_resolve_snippets(snippets, retrieval_id))
         if not snippets:
             return {"error": "No review data available for aspect extraction."}
 
-        llm = get_llm()
-        aspects_prompt = get_aspects_prompt()
-        formatted_prompt = aspects_prompt.format(reviews=json.dumps(snippets), question=question)
-
-        # Use structured output with AspectAnalysis model
-        response = llm.with_structured_output(AspectAnalysis).invoke(formatted_prompt)
+        response = _analyze(snippets, question, render_aspects_prompt, AspectAnalysis)
 
-        # Check if no aspects were found
-        if response.total_aspects == 0 or not response.aspects:
-            return {"error": "No specific aspects were identified in the reviews."}
-
-        # Convert AspectAnalysis model to dictionary
-        return {
-            "total_aspects": response.total_aspects,
-            "aspects": [
-                {
-                    "name": aspect.name,
-                    "frequency": aspect.frequency,
-                    "sentiment_score": aspect.sentiment_score,
-                    "positive_examples": aspect.positive_examples,
-                    "neutral_examples": aspect.neutral_examples,
-                    "negative_examples": aspect.negative_examples
-                }
-                for aspect in response.aspects
-            ]
-        }
+        return _aspects_to_dict(response)
 
     except Exception as e:
         return {"error": f"Error extracting aspects: {str(e)}"}
 
 @tool("jtbd_analysis", args_schema=ToolInput)
-def infer_jtbd(snippets: list[str | dict], question: str) -> dict:
+def infer_jtbd(question: str, snippets: list[str | dict] | None = None, retrieval_id: str | None = None) -> dict:
     """Analyze customer goals, motivations, and Jobs-to-Be-Done from reviews.
-    Requires snippets from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
+    Requires a retrieval_id (or snippets) from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
 
     Use this tool when the user asks about:
     - Why customers choose the service (e.g., "What are customers trying to accomplish?")
@@ -149,31 +362,56 @@ def infer_jtbd(snippets: list[str | dict], question: str) -> dict:
     Returns: Dictionary with job description, situation, motivation, expected outcomes, and frustrations.
     """
     try:
-        snippets = _normalize_snippets(snippets)
+        snippets = _prepare_for_llm(_resolve_snippets(snippets, retrieval_id))
         if not snippets:
             return {"error": "No review data available for JTBD analysis."}
 
-        llm = get_llm()
+        response = _analyze(snippets, question, render_jtbd_prompt, JTBD)
 
-        jtbd_prompt = get_jtbd_prompt()
-        formatted_prompt = jtbd_prompt.format(reviews=json.dumps(snippets), question=question)
-
-        # Use structured output with JTBD model
-        response = llm.with_structured_output(JTBD).invoke(formatted_prompt)
-
-        return {
-            "job": response.job,
-            "situation": response.situation,
-            "motivation": response.motivation,
-            "expected_outcome": response.expected_outcome,
-            "frustrations": response.frustrations,
-            "quotes": response.quotes,
-            "total_reviews": len(snippets)
-        }
+        return _jtbd_to_dict(response, len(snippets))
 
     except Exception as e:
         return {"error": f"Error performing JTBD analysis: {str(e)}"}
 
+@tool("combined_analysis", args_schema=CombinedToolInput)
+def run_combined_analysis(
+    question: str,
+    snippets: list[str | dict] | None = None,
+    retrieval_id: str | None = None,
+    analyses: list[str] | None = None,
+) -> dict:
+    """Run sentiment analysis, aspect extraction and JTBD analysis together in a single step.
+    Requires a retrieval_id (or snippets) from retrieve_reviews. Do not call this tool more than once unless you retrieved new snippets.
+
+    Use this tool instead of calling the three analysis tools separately when the user asks for:
+    - A complete, full, or overall analysis of reviews (e.g., "Analyze Scaleway reviews")
+    - Sentiment together with features and customer goals
+    - Any question that needs two or more of the individual analyses on the same snippets
+    Pass analyses (e.g. ["sentiment", "aspects"]) when only some of the three are needed.
+
+    Returns: Dictionary with the requested sentiment_analysis, aspect_extraction and jtbd_analysis results.
+    """
+    try:
+        snippets = _prepare_for_llm(_resolve_snippets(snippets, retrieval_id))
+        if not snippets:
+            return {"error": "No review data available for combined analysis."}
+
+        sections = tuple(name for name in COMBINED_SECTIONS if not analyses or name in analyses)
+        render_prompt = render_combined_prompt if sections == COMBINED_SECTIONS else partial(render_combined_prompt, sections=sections)
+        # One structured output call returns all requested analyses
+        response = _analyze(snippets, question, render_prompt, _combined_schema(sections))
+
+        result = {}
+        if "sentiment" in sections:
+            result["sentiment_analysis"] = _sentiment_to_dict(response.sentiment)
+        if "aspects" in sections:
+            result["aspect_extraction"] = _aspects_to_dict(response.aspects)
+        if "jtbd" in sections:
+            result["jtbd_analysis"] = _jtbd_to_dict(response.jtbd, len(snippets))
+        return result
+
+    except Exception as e:
+        return {"error": f"Error performing combined analysis: {str(e)}"}
 
 @tool("retrieve_reviews", args_schema=RetrievalInput)
 def retrieve_reviews(
@@ -194,22 +432,28 @@ def retrieve_reviews(
             top_k=top_k,
             fetch_k=fetch_k,
         )
-        # Normalize into Snippet models
-        snippets: list[Snippet] = []
+        # Normalize into Snippet models, validated and dumped as one batch
+        items = []
         for snip in raw_snippets:
             if isinstance(snip, dict) and snip.get("text"):
-                snippets.append(Snippet(
-                    text=str(snip.get("text", "")),
-                    rating=snip.get("rating"),
-                    date=snip.get("date"),
-                    source=snip.get("source"),
-                    vendor=snip.get("vendor"),
-                    review_header=snip.get("review_header"),
-                ))
+                items.append({
+                    "text": str(snip["text"]),
+                    "rating": snip.get("rating"),
+                    "date": snip.get("date"),
+                    "source": snip.get("source"),
+                    "vendor": snip.get("vendor"),
+                    "review_header": snip.get("review_header"),
+                })
             elif isinstance(snip, str) and snip.strip():
-                snippets.append(Snippet(text=snip.strip()))
+                items.append({"text": snip.strip()})
 
-        payload = RetrievalResult(snippets=snippets, count=len(snippets))
-        return payload.model_dump()
+        snippets = _SNIPPET_LIST.validate_python(items)
+        retrieval_id = _store_snippets(_normalize_snippets(snippets))
+        # RetrievalResult.model_dump(exclude_none=True) shape: unset fields (e.g. url) are left out
+        return {
+            "snippets": _SNIPPET_LIST.dump_python(snippets, exclude_none=True),
+            "count": len(snippets),
+            "retrieval_id": retrieval_id,
+        }
     except Exception as e:
         return {"error": f"Error retrieving reviews: {str(e)}"}
\ No newline at end of file
@@ -0,0 +1,47 @@
+from langchain_core.messages import AIMessageChunk
+
+import chains
+
+
+class _StreamingLLM:
+    def stream(self, prompt):
+        yield AIMessageChunk(content="Support is fast.")
+
+
+def _run(stream):
+    chunks = []
+    try:
+        while True:
+            chunks.append(next(stream))
+    except StopIteration as e:
+        return chunks, e.value
+
+
+def test_empty_index_skips_embedding(monkeypatch):
+    def fail_embed(question):
+        raise AssertionError("embed_query called on an empty index")
+
+    monkeypatch.setattr(chains, "index_is_empty", lambda: True)
+    monkeypatch.setattr(chains, "embed_query", fail_embed)
+    monkeypatch.setattr(chains, "get_llm", lambda: _StreamingLLM())
+
+    chunks, metadata = _run(chains.rag_chain_stream("How is support?"))
+
+    assert chunks == [chains.NO_HIT_MESSAGE]
+    assert metadata == {"snippets": []}
+
+
+def test_embedding_outage_falls_through_to_retrieval(monkeypatch):
+    def broken_embed(question):
+        raise ConnectionError("embeddings unavailable")
+
+    snippets = [{"text": "Fast support", "rating": 5, "date": "2025-01-01", "source": "Ann"}]
+    monkeypatch.setattr(chains, "index_is_empty", lambda: False)
+    monkeypatch.setattr(chains, "embed_query", broken_embed)
+    monkeypatch.setattr(chains, "retrieve_documents", lambda *args: snippets)
+    monkeypatch.setattr(chains, "get_llm", lambda: _StreamingLLM())
+
+    chunks, metadata = _run(chains.rag_chain_stream("How is support?"))
+
+    assert chunks == ["Support is fast."]
+    assert metadata == {"snippets": snippets}
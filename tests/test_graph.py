@@ -0,0 +1,88 @@
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import graph
+
+
+def _conversation(turns, words=50):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i} " + "word " * words))
+        messages.append(AIMessage(content=f"answer {i} " + "word " * words))
+    return messages
+
+
+def test_windowed_history_keeps_single_turn():
+    messages = _conversation(1)
+    assert graph.windowed_history(messages, max_tokens=1) == messages
+
+
+def test_windowed_history_fits_budget():
+    messages = _conversation(5)
+    assert graph.windowed_history(messages, max_tokens=100_000) == messages
+
+
+def test_windowed_history_always_keeps_current_turn():
+    messages = _conversation(5)
+    window = graph.windowed_history(messages, max_tokens=1)
+    assert window == messages[-2:]
+    assert isinstance(window[0], HumanMessage)
+
+
+def test_windowed_history_drops_whole_turns():
+    messages = _conversation(5)
+    per_turn = sum(graph.count_tokens([graph._message_text(m) for m in messages[:2]]))
+    window = graph.windowed_history(messages, max_tokens=per_turn * 2 + 1)
+    assert window == messages[-4:]
+
+
+class _RecordingModel:
+    def __init__(self):
+        self.messages = None
+
+    def invoke(self, messages):
+        self.messages = messages
+        return AIMessage(content="ok")
+
+
+def test_agent_node_sends_full_history_when_tokenizer_fails(monkeypatch):
+    def broken_count_tokens(texts):
+        raise OSError("encoding download failed")
+
+    model = _RecordingModel()
+    monkeypatch.setattr(graph, "count_tokens", broken_count_tokens)
+    monkeypatch.setattr(graph, "get_tool_model", lambda: model)
+    messages = _conversation(3)
+
+    result = graph.agent_node({"messages": messages, "tool_outputs": [], "snippets": []})
+
+    assert result["messages"][0].content == "ok"
+    assert model.messages == [graph.SYSTEM_MESSAGE] + messages
+
+
+def test_tool_threads_do_not_keep_session_context(monkeypatch):
+    from streamlit.runtime.scriptrunner_utils import script_run_context
+
+    attached = []
+
+    def record_ctx(call, tools_dict):
+        thread = threading.current_thread()
+        attached.append(getattr(thread, script_run_context.SCRIPT_RUN_CONTEXT_ATTR_NAME, None))
+        return None, [], []
+
+    session_ctx = object()
+    monkeypatch.setattr(graph, "_execute_tool_call", record_ctx)
+    monkeypatch.setattr(script_run_context, "get_script_run_ctx", lambda suppress_warning=False: session_ctx)
+    monkeypatch.setattr(script_run_context, "add_script_run_ctx", lambda thread, ctx: setattr(
+        thread, script_run_context.SCRIPT_RUN_CONTEXT_ATTR_NAME, ctx
+    ))
+    calls = [{"name": "sentiment_analysis", "args": {}, "id": str(i)} for i in range(4)]
+
+    graph._run_tool_calls(calls, {})
+    pool_threads = list(graph.get_tool_executor()._threads)
+
+    assert attached == [session_ctx] * len(calls)
+    assert pool_threads
+    for thread in pool_threads:
+        assert getattr(thread, script_run_context.SCRIPT_RUN_CONTEXT_ATTR_NAME, None) is None
@@ -0,0 +1,48 @@
+import pytest
+
+import retrieval
+
+
+class _Collection:
+    def __init__(self):
+        self.documents = []
+        self.count_calls = 0
+
+    def count(self):
+        self.count_calls += 1
+        return len(self.documents)
+
+    def query(self, query_embeddings, n_results, where, include):
+        return {
+            "documents": [self.documents[:n_results]],
+            "metadatas": [[{"review_id": str(i), "score": 5} for i in range(len(self.documents[:n_results]))]],
+        }
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = _Collection()
+    monkeypatch.setattr(retrieval, "get_collection", lambda: collection)
+    monkeypatch.setattr(retrieval, "embed_query", lambda question: (1.0, 0.0))
+    monkeypatch.setattr(retrieval, "_index_populated", False)
+    monkeypatch.setattr(retrieval, "_retrieval_cache", retrieval.SemanticCache())
+    retrieval._cached_query.cache_clear()
+    return collection
+
+
+def test_empty_result_before_ingest_is_not_cached(collection):
+    assert retrieval.retrieve_documents("How is support?", chunk_type="review") == []
+
+    collection.documents = ["Support answered in minutes."]
+
+    snippets = retrieval.retrieve_documents("How is support?", chunk_type="review")
+    assert [snippet["text"] for snippet in snippets] == ["Support answered in minutes."]
+
+
+def test_populated_index_is_counted_once(collection):
+    collection.documents = ["Support answered in minutes."]
+
+    retrieval.retrieve_documents("How is support?", chunk_type="review")
+    retrieval.retrieve_documents("Is billing clear?", chunk_type="review")
+
+    assert collection.count_calls == 1
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+import clients
+import tools
+
+
+@pytest.fixture(autouse=True)
+def snippet_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(clients, "SNIPPET_STORE_PATH", tmp_path / "snippet_store.db")
+    local = threading.local()
+    monkeypatch.setattr(clients, "_snippet_store_local", local)
+    monkeypatch.setattr(clients, "_snippet_store_ready", False)
+    monkeypatch.setattr(tools, "_snippet_store", tools.OrderedDict())
+    yield
+    if getattr(local, "conn", None) is not None:
+        local.conn.close()
+
+
+def test_resolve_snippets_from_memory():
+    snippets = [{"text": "Fast support", "rating": 5}]
+    retrieval_id = tools._store_snippets(snippets)
+    assert tools._resolve_snippets(None, retrieval_id) == snippets
+
+
+def test_resolve_snippets_after_restart():
+    snippets = [{"text": "Fast support", "rating": 5}]
+    retrieval_id = tools._store_snippets(snippets)
+    tools._snippet_store.clear()  # process-local LRU is gone, SQLite remains
+    assert tools._resolve_snippets(None, retrieval_id) == snippets
+
+
+def test_unknown_retrieval_id_falls_back_to_passed_snippets():
+    assert tools._resolve_snippets([{"text": " Slow billing "}], "unknown") == [{"text": "Slow billing"}]
+
+
+def test_unknown_retrieval_id_returns_explicit_error():
+    result = tools.summarize_sentiment.invoke({"question": "How is support?", "retrieval_id": "unknown"})
+    assert "retrieval_id unknown expired; call retrieve_reviews again" in result["error"]
+
+
+def test_expired_retrievals_are_pruned_at_open():
+    retrieval_id = tools._store_snippets([{"text": "Fast support", "rating": 5}])
+    with clients.get_snippet_store_connection() as conn:
+        conn.execute(
+            "UPDATE retrievals SET created_at = ?",
+            (time.time() - clients.SNIPPET_STORE_RETENTION - 1,),
+        )
+    clients._snippet_store_local.conn.close()
+    clients._snippet_store_local.conn = None
+    clients._snippet_store_ready = False
+
+    count = clients.get_snippet_store_connection().execute("SELECT COUNT(*) FROM retrievals").fetchone()[0]
+    assert count == 0
+    tools._snippet_store.clear()
+    with pytest.raises(ValueError):
+        tools._resolve_snippets(None, retrieval_id)